@@ -1,3 +1,4 @@
+import os
 import subprocess
 import select
 import logging
@@ -7,6 +8,8 @@ import json
 
 logger = logging.getLogger("LogCollector")
 
+READ_CHUNK = 65536  # Bytes pulled from the journalctl pipe per read
+
 class LogWatcher:
     def __init__(self, callback, command=None):
         self.callback = callback
@@ -38,16 +41,17 @@ class LogWatcher:
                 self.command,
                 stdout=subprocess.PIPE,
                 stderr=subprocess.PIPE,
-                text=True,  # Text mode for easier JSON parsing
-                bufsize=1 
+                bufsize=0  # Raw binary pipe: we split lines ourselves, json.loads takes bytes
             )
         except FileNotFoundError:
             logger.critical(f"Command not found: {self.command[0]}")
             self.running = False
             return
 
+        stdout_fd = self.proc.stdout.fileno()
         poller = select.poll()
-        poller.register(self.proc.stdout, select.POLLIN)
+        poller.register(stdout_fd, select.POLLIN)
+        pending = b""
 
         while self.running:
             if self.proc.poll() is not None:
@@ -57,28 +61,35 @@ class LogWatcher:
 
             events = poller.poll(500) 
             for fd, event in events:
-                if fd == self.proc.stdout.fileno():
-                    line = self.proc.stdout.readline()
-                    if line:
-                        try:
-                            # 1. Parse JSON from Journalctl
-                            entry = json.loads(line)
-                            
-                            # 2. Extract standard fields
-                            # Priority defaults to 6 (Info) if missing
-                            structured_log = {
-                                "message": entry.get("MESSAGE", ""),
-                                "priority": int(entry.get("PRIORITY", 6)), 
-                                "unit": entry.get("_SYSTEMD_UNIT", "system")
-                            }
-                            
-                            # 3. Send Dict to Callback
-                            self.callback(structured_log)
+                if fd == stdout_fd:
+                    # One read drains every line that is ready instead of one readline per line
+                    chunk = os.read(stdout_fd, READ_CHUNK)
+                    if not chunk: continue
+                    lines = (pending + chunk).split(b"\n")
+                    pending = lines.pop()  # Keep the trailing partial line for the next read
+                    for line in lines:
+                        if line: self._handle_line(line)
+
+    def _handle_line(self, line):
+        try:
+            # 1. Parse JSON from Journalctl
+            entry = json.loads(line)
+            
+            # 2. Extract standard fields
+            # Priority defaults to 6 (Info) if missing
+            structured_log = {
+                "message": entry.get("MESSAGE", ""),
+                "priority": int(entry.get("PRIORITY", 6)), 
+                "unit": entry.get("_SYSTEMD_UNIT", "system")
+            }
+            
+            # 3. Send Dict to Callback
+            self.callback(structured_log)
 
-                        except json.JSONDecodeError:
-                            continue # Skip broken lines
-                        except Exception as e:
-                            logger.error(f"Parsing error: {e}")
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            pass # Skip broken or undecodable lines
+        except Exception as e:
+            logger.error(f"Parsing error: {e}")
 
     def _cleanup(self):
         if self.proc:
@@ -0,0 +1,80 @@
+import platform
+import torch
+from sentence_transformers import SentenceTransformer
+
+MODEL_NAME = "all-MiniLM-L6-v2"
+
+# "onnx" runs the int8-quantized export through ONNX Runtime (2-4x faster on CPU).
+# Needs sentence-transformers>=3.2 with the onnx extra; anything else loads the PyTorch model.
+MODEL_BACKEND = "onnx"
+# The VNNI export skips reduce_range, so its U8S8 kernels can saturate (and silently degrade
+# the stored vectors) on CPUs without VNNI; those get the AVX2 export or plain fp32 instead
+ONNX_VNNI = "onnx/model_qint8_avx512_vnni.onnx"
+ONNX_AVX2 = "onnx/model_quint8_avx2.onnx"
+ONNX_ARM64 = "onnx/model_qint8_arm64.onnx"
+ONNX_FP32 = "onnx/model.onnx"
+
+# Typical log lines are well under 20 tokens; capping the sequence keeps stack traces and
+# JSON blobs from paying for attention over hundreds of tokens
+MAX_SEQ_LENGTH = 64
+# Characters kept before tokenizing, so a 10 KB line is not tokenized just to be truncated
+MAX_TEXT_CHARS = 400
+
+def _cpu_flags():
+    try:
+        with open("/proc/cpuinfo") as f:
+            for line in f:
+                if line.startswith("flags"): return set(line.split(":", 1)[1].split())
+    except OSError:
+        pass
+    return set()
+
+def _onnx_file():
+    """Picks the ONNX export matching this CPU, or None if there is none for the architecture."""
+    machine = platform.machine().lower()
+    if machine in ('aarch64', 'arm64'): return ONNX_ARM64
+    if machine not in ('x86_64', 'amd64'): return None
+    flags = _cpu_flags()
+    if 'avx512_vnni' in flags or 'avx_vnni' in flags: return ONNX_VNNI
+    if 'avx2' in flags: return ONNX_AVX2
+    return ONNX_FP32
+
+def load_model(threads=None):
+    """
+    Loads the embedding model shared by the engine and the shell.
+    Both sides must go through here so stored and query vectors come from the same backend.
+    `threads` caps the intra-op pool (PyTorch or ONNX Runtime) when the model shares the CPU with other work.
+    """
+    if threads: torch.set_num_threads(threads)
+    model = None
+    onnx_file = _onnx_file()
+    if MODEL_BACKEND == "onnx" and onnx_file:
+        try:
+            model_kwargs = {"file_name": onnx_file}
+            if threads:
+                # ONNX Runtime ignores torch's setting and defaults to every core
+                import onnxruntime
+                session_options = onnxruntime.SessionOptions()
+                session_options.intra_op_num_threads = threads
+                model_kwargs["session_options"] = session_options
+            model = SentenceTransformer(MODEL_NAME, backend="onnx", model_kwargs=model_kwargs)
+        except Exception as e:
+            print(f"⚠️  ONNX backend unavailable ({e}). Falling back to PyTorch.")
+    if model is None: model = SentenceTransformer(MODEL_NAME)
+    model.max_seq_length = MAX_SEQ_LENGTH
+    return model
+
+def clip(texts):
+    return [t[:MAX_TEXT_CHARS] for t in texts]
+
+def embed(model, texts):
+    """
+    Encodes a handful of texts (a query, re-rank candidates) in a single forward pass.
+    Tokenizes once with longest-padding and calls the model directly, skipping the
+    sorting, sub-batching and conversion bookkeeping SentenceTransformer.encode does per call.
+    Returns unit-length float32 vectors, like encode(..., normalize_embeddings=True).
+    """
+    features = {k: v.to(model.device) for k, v in model.tokenize(clip(texts)).items()}
+    with torch.inference_mode():
+        vecs = model(features)['sentence_embedding']
+    return torch.nn.functional.normalize(vecs.float(), p=2, dim=1).cpu().numpy()
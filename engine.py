@@ -3,44 +3,48 @@ import time
 import threading
 import signal
 import sys
-from sentence_transformers import SentenceTransformer
 from collector.core import LogWatcher
 from normalizer.core import LogNormalizer
 from storage import RelationalLogDB
+from embedder import load_model
 
-MODEL_NAME = "all-MiniLM-L6-v2"
+BATCH_SIZE = 64   # Max logs per batch window; larger flushes give length-sorting more to work with
+MAX_WAIT_MS = 20  # How long a batch window stays open after its first log arrives
 
 class Engine:
     def __init__(self):
         self.running = True
         print("⏳ Engine: Loading AI Model...")
-        self.model = SentenceTransformer(MODEL_NAME)
+        self.model = load_model()
         self.dbs = {
             'error': RelationalLogDB('error'),
             'warning': RelationalLogDB('warning'),
             'debug': RelationalLogDB('debug')
         }
         self.buffers = {k: [] for k in self.dbs}
-        self.last_flush = time.time()
 
     def _get_cat(self, p):
         return 'error' if p <= 3 else 'warning' if p == 4 else 'debug'
 
     def process(self, input_queue):
         while self.running:
-            try:
-                data = input_queue.get(timeout=1.0)
-                if data is None: break
-                
-                cat = self._get_cat(data.get('priority', 6))
-                self.buffers[cat].append(data)
-                
-                if len(self.buffers[cat]) >= 16: self._flush(cat)
-            except queue.Empty: pass
-            
-            if time.time() - self.last_flush > 5.0:
-                for c in self.buffers: self._flush(c)
-                self.last_flush = time.time()
+            try: data = input_queue.get(timeout=1.0)
+            except queue.Empty: continue
+
+            # Dynamic batching: the first log opens a window that closes after
+            # MAX_WAIT_MS or BATCH_SIZE logs, whichever comes first
+            deadline = time.monotonic() + MAX_WAIT_MS / 1000
+            count = 0
+            while data is not None:
+                self.buffers[self._get_cat(data.get('priority', 6))].append(data)
+                count += 1
+                remaining = deadline - time.monotonic()
+                if count >= BATCH_SIZE or remaining <= 0: break
+                try: data = input_queue.get(timeout=remaining)
+                except queue.Empty: break
+
+            for c in self.buffers: self._flush(c)
+            if data is None: break
 
     def _flush(self, cat):
         if self.buffers[cat]:
@@ -52,15 +56,16 @@ class Engine:
         for db in self.dbs.values(): db.close()
 
 def main():
-    raw_q, clean_q = queue.Queue(), queue.Queue()
+    clean_q = queue.Queue()
     
-    collector = LogWatcher(callback=raw_q.put)
-    normalizer = LogNormalizer(input_queue=raw_q, output_queue=clean_q)
+    # The normalizer runs inline on the collector thread: Drain3 is cheap next to
+    # the queue hand-off and GIL switch a separate normalizer thread costs per log
+    normalizer = LogNormalizer(input_queue=None, output_queue=clean_q)
+    collector = LogWatcher(callback=normalizer.process_log)
     engine = Engine()
     
     threads = [
         threading.Thread(target=collector.start),
-        threading.Thread(target=normalizer.start),
         threading.Thread(target=engine.process, args=(clean_q,))
     ]
     for t in threads: t.start()
@@ -70,7 +75,6 @@ def main():
     def shutdown(signum, frame):
         print("\nStopping Engine...")
         collector.stop()
-        normalizer.stop()
         engine.stop()
         sys.exit(0)
 
@@ -2,6 +2,7 @@ import threading
 import queue
 import logging
 import subprocess
+import time
 import re
 from colorama import Fore, Style, init
 from drain3 import TemplateMiner
@@ -10,6 +11,11 @@ from drain3.template_miner_config import TemplateMinerConfig
 init(autoreset=True)
 logger = logging.getLogger("LogNormalizer")
 
+ALERT_INTERVAL = 1.0  # Minimum seconds between desktop alerts; extras are coalesced
+
+# Drain3 wildcard markers; the literal text between them is what we scan for
+PARAM_MARKER = re.compile(r'<\*>|<NUM>')
+
 class LogNormalizer:
     def __init__(self, input_queue, output_queue=None):
         self.input_queue = input_queue
@@ -20,6 +26,10 @@ class LogNormalizer:
         config = TemplateMinerConfig()
         self.miner = TemplateMiner(persistence_handler=None, config=config)
         self.printed_clusters = set()
+        self.template_segments = {}  # cluster_id -> (template, literal segments)
+        self.alert_proc = None       # Last notify-send; at most one runs at a time
+        self.last_alert = float('-inf')
+        self.suppressed_alerts = 0
 
     def start(self):
         self.running = True
@@ -45,25 +55,48 @@ class LogNormalizer:
             except Exception as e:
                 logger.error(f"Error processing log: {e}")
 
-    def _extract_params(self, template, raw_msg):
+    def _template_segments(self, cluster_id, template):
+        """
+        Splits a template into the literal text around its markers, once per cluster.
+        Drain3 keeps generalizing templates, so the cached entry is rebuilt when the text changes.
+        """
+        cached = self.template_segments.get(cluster_id)
+        if cached and cached[0] == template: return cached[1]
+        # "User <*> logged in" -> ["User ", " logged in"]
+        segments = PARAM_MARKER.split(template)
+        self.template_segments[cluster_id] = (template, segments)
+        return segments
+
+    def _scan_params(self, segments, raw_msg):
+        """
+        Walks the message left to right with str.find, returning the text between
+        consecutive literal segments (same result as an anchored lazy regex), or None on mismatch.
+        """
+        first, last = segments[0], segments[-1]
+        if len(segments) == 1: return [] if raw_msg == first else None
+        end = len(raw_msg) - len(last)
+        if not raw_msg.startswith(first) or end < len(first) or not raw_msg.endswith(last): return None
+
+        params, pos = [], len(first)
+        for seg in segments[1:-1]:
+            i = raw_msg.find(seg, pos, end)
+            if i < 0: return None
+            params.append(raw_msg[pos:i])
+            pos = i + len(seg)
+        params.append(raw_msg[pos:end])
+        return params
+
+    def _extract_params(self, template, raw_msg, cluster_id=None):
         """
         Simple heuristic to extract parameters.
         Drain3 templates look like: "Connection from <*>"
         We split both and find the mismatches.
         """
         params = []
-        # This is a basic extraction. 
-        # For production, you might want more robust regex matching based on the template.
         try:
-            # simple regex to extract data where <*> is
-            # converting template "User <*> logged in" to regex "User (.*?) logged in"
-            regex = re.escape(template).replace(re.escape('<*>'), '(.*?)')
-            # Drain3 sometimes uses different markers, ensuring we catch them
-            regex = regex.replace(re.escape('<NUM>'), '(.*?)') 
-            
-            match = re.search(f"^{regex}$", raw_msg)
-            if match:
-                params = list(match.groups())
+            scanned = self._scan_params(self._template_segments(cluster_id, template), raw_msg)
+            if scanned is not None:
+                params = scanned
             else:
                 # Fallback: simple string split difference
                 t_parts = template.split()
@@ -89,7 +122,7 @@ class LogNormalizer:
         template = result["template_mined"]
 
         # 2. Extract Parameters (The variables)
-        params = self._extract_params(template, raw_msg)
+        params = self._extract_params(template, raw_msg, cluster_id)
 
         # 3. Determine Style (Visuals)
         if priority <= 3:
@@ -130,7 +163,18 @@ class LogNormalizer:
             self.output_queue.put(processed_data)
 
     def trigger_alert(self, message):
+        # Runs on the collector thread, so never wait on the desktop. While the previous
+        # notify-send is still running, or within ALERT_INTERVAL of it, coalesce new alerts
+        # into a count instead of spawning a process per error line
+        now = time.monotonic()
+        if now - self.last_alert < ALERT_INTERVAL or (self.alert_proc and self.alert_proc.poll() is None):
+            self.suppressed_alerts += 1
+            return
+        if self.suppressed_alerts:
+            message += f" (+{self.suppressed_alerts} more)"
+            self.suppressed_alerts = 0
         try:
-            subprocess.run(['notify-send', '-u', 'critical', '🔥 SYSTEM ERROR', message])
+            self.alert_proc = subprocess.Popen(['notify-send', '-u', 'critical', '🔥 SYSTEM ERROR', message])
+            self.last_alert = now
         except Exception:
             pass
\ No newline at end of file
@@ -1,19 +1,33 @@
 import sys
-from sentence_transformers import SentenceTransformer
-from storage import RelationalLogDB
+import functools
+from storage import RelationalLogDB, describe_backend
+from embedder import load_model, embed
 
 def main():
     print("⏳ Loading Search Shell...")
-    model = SentenceTransformer("all-MiniLM-L6-v2")
+    # Queries are single sentences; leave the remaining cores to FAISS
+    model = load_model(threads=2)
     dbs = {k: RelationalLogDB(k, mode='reader') for k in ['error', 'warning', 'debug']}
     
     # Words that trigger Time-Sorting
     TIME_KEYWORDS = ['now', 'latest', 'recent', 'current', 'last', 'today']
+    # Stand-in query for "latest"-only searches
+    RECENCY_QUERY = "system device error warning"
+
+    @functools.lru_cache(maxsize=512)
+    def encode_query(text):
+        """Repeated queries skip the forward pass. Callers pass lowercased text (the model is uncased)."""
+        vec = embed(model, [text])
+        vec.setflags(write=False)  # Shared by every repeat of this query
+        return vec
+
+    encode_query(RECENCY_QUERY)  # Warm up: the "latest" shortcut is the most common query
 
     print("\n" + "="*60)
     print("   KERNOLOG SEARCH SHELL")
     print("   Type: search <category> <query>")
     print("   Tip: Use 'now' or 'latest' to see what just happened.")
+    print(f"   Vector search: {describe_backend()}")
     print("="*60 + "\n")
 
     try:
@@ -49,7 +63,7 @@ def main():
                     # 2. Handle "Pure Recency" (User typed only "latest" or "now")
                     if recency and not search_text:
                         print(f"\n\033[1;33m--- {cat.upper()} LATEST LOGS ---\033[0m")
-                        vec = model.encode(["system device error warning"], convert_to_numpy=True, show_progress_bar=False)
+                        vec = encode_query(RECENCY_QUERY)
                         # Pass model here too!
                         res = dbs[cat].search(vec, model=model, k=10, recency_bias=True)
                         if not res: print("No logs found.")
@@ -58,7 +72,7 @@ def main():
                         continue
 
                     # 3. Standard Semantic Search
-                    vec = model.encode([search_text], convert_to_numpy=True, show_progress_bar=False)
+                    vec = encode_query(search_text.strip().lower())
                     
                     # --- FIX IS HERE: Pass 'model=model' ---
                     res = dbs[cat].search(vec, model=model, k=5, recency_bias=recency)
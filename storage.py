@@ -1,12 +1,65 @@
 import os
 import time
 import sqlite3
+import logging
+import threading
 import numpy as np
+from collections import Counter, OrderedDict, defaultdict
+
+try:
+    import faiss  # Optional: approximate search over large vector files
+except ImportError:
+    faiss = None
+
+logger = logging.getLogger("LogStorage")
 
 # Configuration
 DB_PATH = "gen_data"
 EMBED_DIM = 384
 
+# HNSW graph parameters (only used when faiss is installed)
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 40
+HNSW_EF_SEARCH = 64
+# OpenMP threads for FAISS; bounded so it does not oversubscribe cores next to the model's threads
+FAISS_THREADS = min(8, os.cpu_count() or 1)
+# Vectors the background indexer adds per lock hold; bounds how long a search can wait on it
+INDEX_CHUNK = 1024
+# Consecutive indexer errors before the index is dropped and searches fall back to a full scan
+INDEX_MAX_FAILURES = 3
+
+# Forward-pass size inside model.encode. SentenceTransformer sorts inputs by length before
+# splitting them into these sub-batches, so short and long log lines are padded separately.
+ENCODE_BATCH_SIZE = 16
+
+# Re-rank embeddings kept per category (~1.5 KB each)
+RERANK_CACHE_SIZE = 4096
+
+# Shared GPU scratch memory; kept at module level so it outlives every index using it
+_gpu_res = None
+# StandardGpuResources is not thread-safe: every GPU index uses this as its index_lock,
+# so all categories' indexers and searches take turns on it
+_gpu_lock = threading.Lock()
+
+def _use_gpu():
+    return faiss is not None and hasattr(faiss, "StandardGpuResources") and faiss.get_num_gpus() > 0
+
+# FAISS SIMD levels, widest first, with the CPU feature flag each one needs
+SIMD_CPU_FLAGS = {"AVX512_SPR": "AVX512_SPR", "AVX512": "AVX512F", "AVX2": "AVX2", "SVE": "SVE", "NEON": "NEON"}
+
+def describe_backend():
+    """One-line summary of the vector search backend, for startup banners."""
+    if faiss is None: return "numpy brute force (pip install faiss-cpu for HNSW)"
+    if _use_gpu(): return f"FAISS GPU flat index ({faiss.get_num_gpus()} GPU)"
+    # Compile options of the loaded library, e.g. "OPTIMIZE AVX2 AVX512 ...". Dynamic-dispatch
+    # ("DD") builds list every compiled target, so there the CPU must support the level too
+    built = faiss.get_compile_options().split() if hasattr(faiss, "get_compile_options") else []
+    if "DD" in built:
+        cpu = faiss.supported_instruction_sets() if hasattr(faiss, "supported_instruction_sets") else set()
+        built = [opt for opt in built if SIMD_CPU_FLAGS.get(opt) in cpu]
+    simd = next((opt for opt in SIMD_CPU_FLAGS if opt in built), "generic")
+    return f"FAISS HNSW, {FAISS_THREADS} threads, SIMD: {simd}"
+
 class RelationalLogDB:
     def __init__(self, name, mode='writer'):
         self.name = name
@@ -25,6 +78,12 @@ class RelationalLogDB:
             self.template_cache = {}
             self._load_cache()
 
+        self.index = None
+        self.indexed_count = 0
+        self.index_lock = threading.Lock()
+        self.indexer = None
+        self.rerank_cache = OrderedDict()  # hydrated text -> vector, LRU order
+
         self.vec_count = 0
         if os.path.exists(self.vec_file):
             self.vec_count = os.path.getsize(self.vec_file) // (self.dim * 4)
@@ -35,46 +94,58 @@ class RelationalLogDB:
             self.conn.execute('CREATE TABLE IF NOT EXISTS occurrences (id INTEGER PRIMARY KEY, template_id INTEGER, timestamp REAL, priority INT, FOREIGN KEY(template_id) REFERENCES templates(id))')
             self.conn.execute('CREATE TABLE IF NOT EXISTS parameters (id INTEGER PRIMARY KEY, occurrence_id INTEGER, position INTEGER, value TEXT, FOREIGN KEY(occurrence_id) REFERENCES occurrences(id))')
             self.conn.execute('CREATE INDEX IF NOT EXISTS idx_template_text ON templates(text)')
+            # Lookups used by search() to resolve vector hits back to rows
+            self.conn.execute('CREATE INDEX IF NOT EXISTS idx_template_vec ON templates(vector_idx)')
+            self.conn.execute('CREATE INDEX IF NOT EXISTS idx_occ_template ON occurrences(template_id, timestamp)')
+            self.conn.execute('CREATE INDEX IF NOT EXISTS idx_param_occ ON parameters(occurrence_id, position)')
 
     def _load_cache(self):
+        # Keyed by the 64-bit hash of the template text: the strings themselves already live
+        # in SQLite, and an int key is far smaller than keeping every template in memory twice
         cursor = self.conn.execute("SELECT id, text, vector_idx FROM templates")
-        self.template_cache = {row[1]: (row[0], row[2]) for row in cursor}
+        self.template_cache = {hash(row[1]): (row[0], row[2]) for row in cursor}
 
     def add_batch(self, model, batch_data):
         base_time = time.time()
-        unique_texts, updates, occ_insert, param_insert, batch_map = [], [], [], [], []
+        occ_insert, param_insert = [], []
+        new_texts = {}  # text -> batch positions, in first-seen order
+        # Repeats of a known template collapse into one UPDATE per template, not one per log
+        repeats, last_seen = Counter(), {}
         
         for i, item in enumerate(batch_data):
             # 1ms offset to prevent sort collisions
             item_ts = base_time + (i * 0.001)
             
             text = item['message']
-            if text in self.template_cache:
-                tid, _ = self.template_cache[text]
-                updates.append((item_ts, tid))
+            cached = self.template_cache.get(hash(text))
+            if cached:
+                tid = cached[0]
+                repeats[tid] += 1
+                last_seen[tid] = item_ts
                 self._prepare_occ(tid, item, occ_insert, param_insert, timestamp=item_ts)
             else:
-                if text not in unique_texts: unique_texts.append(text)
-                batch_map.append((i, text))
+                new_texts.setdefault(text, []).append(i)
 
-        if unique_texts:
-            vecs = model.encode(unique_texts, convert_to_numpy=True)
+        if new_texts:
+            from embedder import clip  # Lazy: keeps storage importable without torch
+            unique_texts = list(new_texts)
+            vecs = model.encode(clip(unique_texts), batch_size=ENCODE_BATCH_SIZE, convert_to_numpy=True, normalize_embeddings=True, show_progress_bar=False)
             with open(self.vec_file, "ab") as f: f.write(vecs.tobytes())
             
             start_idx = self.vec_count
             for idx, txt in enumerate(unique_texts):
                 v_idx = start_idx + idx
-                cur = self.conn.execute("INSERT INTO templates (text, vector_idx, first_seen, last_seen) VALUES (?, ?, ?, ?)", (txt, v_idx, base_time, base_time))
+                positions = new_texts[txt]
+                cur = self.conn.execute("INSERT INTO templates (text, vector_idx, first_seen, last_seen, count) VALUES (?, ?, ?, ?, ?)", (txt, v_idx, base_time, base_time + (positions[-1] * 0.001), len(positions)))
                 tid = cur.lastrowid
-                self.template_cache[txt] = (tid, v_idx)
-                for b_i, b_txt in batch_map:
-                    if b_txt == txt:
-                        correct_ts = base_time + (b_i * 0.001)
-                        self._prepare_occ(tid, batch_data[b_i], occ_insert, param_insert, timestamp=correct_ts)
+                self.template_cache[hash(txt)] = (tid, v_idx)
+                for b_i in positions:
+                    correct_ts = base_time + (b_i * 0.001)
+                    self._prepare_occ(tid, batch_data[b_i], occ_insert, param_insert, timestamp=correct_ts)
             self.vec_count += len(vecs)
 
         with self.conn:
-            if updates: self.conn.executemany("UPDATE templates SET last_seen=?, count=count+1 WHERE id=?", updates)
+            if repeats: self.conn.executemany("UPDATE templates SET last_seen=?, count=count+? WHERE id=?", [(last_seen[tid], n, tid) for tid, n in repeats.items()])
             if occ_insert: self.conn.executemany("INSERT INTO occurrences (id, template_id, timestamp, priority) VALUES (?,?,?,?)", occ_insert)
             if param_insert: self.conn.executemany("INSERT INTO parameters (occurrence_id, position, value) VALUES (?,?,?)", param_insert)
 
@@ -83,81 +154,173 @@ class RelationalLogDB:
         occ_list.append((oid, tid, timestamp, item.get('priority',6)))
         for i, p in enumerate(item.get('params',[])): param_list.append((oid, i, str(p)))
 
+    def _build_index(self):
+        global _gpu_res
+        if _use_gpu():
+            # On a GPU an exact flat scan beats HNSW and keeps perfect recall.
+            # Switch to the shared lock first: creating the resources and copying the index
+            # touch _gpu_res just like the other categories' adds and searches do
+            self.index_lock = _gpu_lock
+            with _gpu_lock:
+                if _gpu_res is None: _gpu_res = faiss.StandardGpuResources()
+                return faiss.index_cpu_to_gpu(_gpu_res, 0, faiss.IndexFlatIP(self.dim))
+        # fp16 storage halves the bytes streamed per distance; needs no training, unlike 8-bit
+        faiss.omp_set_num_threads(FAISS_THREADS)
+        index = faiss.IndexHNSWSQ(self.dim, faiss.ScalarQuantizer.QT_fp16, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        index.hnsw.efSearch = HNSW_EF_SEARCH
+        return index
+
+    def _vec_file_count(self):
+        return os.path.getsize(self.vec_file) // (self.dim * 4) if os.path.exists(self.vec_file) else 0
+
+    def _ensure_indexer(self):
+        """
+        Lazily builds the vector index (GPU flat if a GPU is visible, fp16 HNSW otherwise)
+        and starts the thread that keeps it fed. Returns False when faiss is not installed.
+        """
+        if faiss is None: return False
+        if self.indexer is None:
+            self.index = self._build_index()
+            self.indexer = threading.Thread(target=self._index_worker, name=f"Indexer-{self.name}", daemon=True)
+            self.indexer.start()
+        return True
+
+    def _index_worker(self):
+        """
+        Adds newly appended vectors in INDEX_CHUNK slices, taking index_lock only for the add,
+        so a search never waits behind a full (re)build of the graph.
+        """
+        failures = 0
+        while self.indexer is not None:
+            try:
+                count = self._vec_file_count()
+                if count <= self.indexed_count:
+                    time.sleep(1.0)
+                    continue
+                start, end = self.indexed_count, min(count, self.indexed_count + INDEX_CHUNK)
+                mm = np.memmap(self.vec_file, dtype='float32', mode='r', shape=(end, self.dim))
+                chunk = np.array(mm[start:end])  # Copy out before taking the lock
+                del mm
+                with self.index_lock:
+                    self.index.add(chunk)
+                    self.indexed_count = end
+                failures = 0
+            except Exception as e:
+                failures += 1
+                logger.error(f"Indexer error on '{self.name}' ({failures}/{INDEX_MAX_FAILURES}): {e}")
+                if failures >= INDEX_MAX_FAILURES:
+                    logger.error(f"Disabling the vector index for '{self.name}'. Searches fall back to a full scan.")
+                    with self.index_lock:
+                        self.index, self.indexed_count = None, 0
+                    return
+                time.sleep(1.0)
+
     def search(self, query_vector, model, k=5, recency_bias=False):
         """
         Updated Search with Live Re-Ranking.
         Requires passing the `model` instance to encode full sentences on the fly.
         """
-        if os.path.exists(self.vec_file): self.vec_count = os.path.getsize(self.vec_file) // (self.dim * 4)
+        self.vec_count = self._vec_file_count()
         if self.vec_count == 0: return ["No logs indexed yet."]
         
         # 1. Broad Phase: Get top 20 candidates based on Template Structure
         search_k = min(20, self.vec_count)
         
         mm = np.memmap(self.vec_file, dtype='float32', mode='r', shape=(self.vec_count, self.dim))
-        scores = np.dot(mm, query_vector.T).flatten()
-        top_indices = np.argpartition(scores, -search_k)[-search_k:]
+        query = np.ascontiguousarray(query_vector, dtype='float32')
+        ids, scores, indexed = np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32), 0
+        if self._ensure_indexer():
+            # HNSW: O(log N) graph walk instead of scanning every vector.
+            # The lock covers only the walk; the indexer's adds interleave in small chunks.
+            with self.index_lock:
+                indexed = self.indexed_count
+                if indexed: dists, labels = self.index.search(query, min(search_k, indexed))
+            if indexed:
+                found = labels[0] >= 0
+                ids, scores = labels[0][found], dists[0][found]
+        if indexed < self.vec_count:
+            # Exact scan over whatever the index has not caught up with (everything, without faiss)
+            tail = np.dot(mm[indexed:], query.T).flatten()
+            tail_k = min(search_k, len(tail))
+            top = np.argpartition(tail, -tail_k)[-tail_k:]
+            ids, scores = np.concatenate([ids, top + indexed]), np.concatenate([scores, tail[top]])
+        hit_ids = [int(i) for i in ids[np.argsort(-scores)[:search_k]]]
         
-        raw_candidates = []
-        for idx in top_indices:
-            row = self.conn.execute("SELECT id, text, count, last_seen FROM templates WHERE vector_idx=?", (int(idx),)).fetchone()
-            if row:
-                # Fetch the LATEST occurrence with its parameters
-                occ_row = self.conn.execute("SELECT id, timestamp FROM occurrences WHERE template_id=? ORDER BY timestamp DESC LIMIT 1", (row[0],)).fetchone()
-                
-                full_text = row[1]
-                ts = row[3]
-                
-                if occ_row:
-                    ts = occ_row[1]
-                    params = [r[0] for r in self.conn.execute("SELECT value FROM parameters WHERE occurrence_id=? ORDER BY position", (occ_row[0],))]
-                    
-                    # Construct the REAL sentence (Hydrate)
-                    # We use this for re-ranking so the model sees "SanDisk"
-                    temp_text = full_text
-                    for p in params:
-                        if "<*>" in temp_text: temp_text = temp_text.replace("<*>", str(p), 1)
-                        else: temp_text += f" {p}"
-                    full_text = temp_text
-                
-                raw_candidates.append({
-                    'template_score': float(scores[idx]),
-                    'ts': ts,
-                    'full_text': full_text, # This now contains "SanDisk" or "Skullcandy"
-                    'display_text': self._highlight_params(row[1], params if occ_row else [])
-                })
+        # Resolve all hits with one query per table instead of three per candidate
+        rows = {r[0]: r[1:] for r in self._select_in("SELECT vector_idx, id, text, last_seen FROM templates WHERE vector_idx IN ({})", hit_ids)}
+        hit_ids = [idx for idx in hit_ids if idx in rows]
+        # Bare columns next to MAX() come from the LATEST occurrence of each template
+        latest = {r[0]: r[1:] for r in self._select_in("SELECT template_id, id, MAX(timestamp) FROM occurrences WHERE template_id IN ({}) GROUP BY template_id", [rows[idx][0] for idx in hit_ids])}
+        occ_params = defaultdict(list)
+        for oid, value in self._select_in("SELECT occurrence_id, value FROM parameters WHERE occurrence_id IN ({}) ORDER BY occurrence_id, position", [occ[0] for occ in latest.values()]):
+            occ_params[oid].append(value)
+
+        # Candidates are kept as parallel columns rather than one dict per row
+        full_texts, display_texts, stamps = [], [], []
+        for idx in hit_ids:
+            tid, text, last_seen = rows[idx]
+            occ = latest.get(tid)
+            params = occ_params[occ[0]] if occ else []
+            # Construct the REAL sentence (Hydrate)
+            # We use this for re-ranking so the model sees "SanDisk"
+            full_texts.append(self._hydrate(text, params))
+            display_texts.append(self._highlight_params(text, params))
+            stamps.append(occ[1] if occ else last_seen)
         
+        output = []
         # 2. Narrow Phase: Live Re-Ranking
         # We encode the FULL texts (with params) and check against the query again
-        if raw_candidates:
-            texts_to_rank = [c['full_text'] for c in raw_candidates]
-            
+        if full_texts:
             # This is fast because we only encode ~20 sentences
-            new_vecs = model.encode(texts_to_rank, convert_to_numpy=True, show_progress_bar=False)
-            new_scores = np.dot(new_vecs, query_vector.T).flatten()
-            
-            for i, c in enumerate(raw_candidates):
-                c['final_score'] = float(new_scores[i])
+            new_vecs = self._embed_cached(model, full_texts)
+            final_scores = np.dot(new_vecs, query_vector.T).flatten()
+            stamps = np.array(stamps, dtype=np.float64)
 
             # 3. Sort
             if recency_bias:
                 # If user wants "Latest", sort by time, but filter out low relevance (< 0.2)
-                raw_candidates = [c for c in raw_candidates if c['final_score'] > 0.15]
-                raw_candidates.sort(key=lambda x: x['ts'], reverse=True)
+                keep = np.flatnonzero(final_scores > 0.15)
+                order = keep[np.argsort(-stamps[keep], kind='stable')]
             else:
                 # Otherwise sort by the new Smart Score
-                raw_candidates.sort(key=lambda x: x['final_score'], reverse=True)
+                order = np.argsort(-final_scores, kind='stable')
 
-        output = []
-        for item in raw_candidates[:k]:
-            dt = time.localtime(item['ts'])
-            millis = int((item['ts'] % 1) * 1000)
-            t_str = f"{time.strftime('%H:%M:%S', dt)}.{millis:03d}"
-            output.append(f"[Score:{item['final_score']:.2f}] {t_str} | {item['display_text']}")
+            for i in order[:k]:
+                ts = stamps[i]
+                dt = time.localtime(ts)
+                millis = int((ts % 1) * 1000)
+                t_str = f"{time.strftime('%H:%M:%S', dt)}.{millis:03d}"
+                output.append(f"[Score:{final_scores[i]:.2f}] {t_str} | {display_texts[i]}")
         
         del mm
         return output
 
+    def _embed_cached(self, model, texts):
+        """
+        Re-rank vectors keyed by hydrated text. A template's latest occurrence rarely
+        changes between queries, so most candidates skip the forward pass.
+        """
+        missing = [t for t in dict.fromkeys(texts) if t not in self.rerank_cache]
+        if missing:
+            from embedder import embed  # Lazy: keeps storage importable without torch
+            # Copy each row so an evicted neighbour does not keep the whole batch array alive
+            for t, v in zip(missing, embed(model, missing)): self.rerank_cache[t] = v.copy()
+        for t in texts: self.rerank_cache.move_to_end(t)
+        vecs = np.array([self.rerank_cache[t] for t in texts])
+        while len(self.rerank_cache) > RERANK_CACHE_SIZE: self.rerank_cache.popitem(last=False)
+        return vecs
+
+    def _select_in(self, sql, values):
+        if not values: return []
+        return self.conn.execute(sql.format(",".join("?" * len(values))), values).fetchall()
+
+    def _hydrate(self, text, params):
+        for p in params:
+            if "<*>" in text: text = text.replace("<*>", str(p), 1)
+            else: text += f" {p}"
+        return text
+
     def _highlight_params(self, text, params):
         for p in params:
             p_str = f"\033[1;33m{p}\033[0m"
@@ -165,4 +328,6 @@ class RelationalLogDB:
             else: text += f" {p_str}"
         return text
 
-    def close(self): self.conn.close()
\ No newline at end of file
+    def close(self):
+        self.indexer = None  # Lets the indexer thread exit
+        self.conn.close()
\ No newline at end of file